@@ -146,7 +146,7 @@ class StratifiedSamplingBinSelector(object):
 
         if len(self.model.columns) == 0:
             raise ValueError("You must add at least one column before fitting.")
-        if any([not col["auto_bin"] for name, col in self.model.columns.items()]):
+        if any([not col.auto_bin for name, col in self.model.columns.items()]):
             raise ValueError("This form of fitting only works n_bins is not set")
         logger.debug(self.model.columns)
         min_distance = float("Inf")
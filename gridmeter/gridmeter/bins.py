@@ -40,10 +40,47 @@ class BinnedData:
     def _map_bins(self, df):
         """Add '_bin' column to df indicating which bin each row maps to."""
         df.loc[:, "_bin"] = None
-
-        for b in self.binning.multibins:
-            df.loc[b.filter_expr()(df), "_bin"] = b
-            df.loc[b.filter_expr()(df), "_bin_label"] = b.label
+        multibins = self.binning.multibins
+        if not multibins:
+            return df
+
+        # Locate each row's 1-dimensional bin per column, then combine the
+        # per-column positions into a flat index into the multibins.
+        n_columns = len(multibins[0].bins)
+        bins_by_column = []
+        for j in range(n_columns):
+            bins = {mb.bins[j].index: mb.bins[j] for mb in multibins}
+            bins_by_column.append([bins[index] for index in sorted(bins)])
+        positions = np.empty((n_columns, len(df)), dtype=np.intp)
+        for j, bins in enumerate(bins_by_column):
+            edges = np.array([b.min for b in bins] + [bins[-1].max], dtype=float)
+            values = df[bins[0].column].to_numpy()
+            if values.dtype.kind != "f":
+                values = values.astype(float)
+            positions[j] = _assign_bins(values, edges)
+
+        shape = tuple(len(bins) for bins in bins_by_column)
+        position_by_index = [
+            {b.index: k for k, b in enumerate(bins)} for bins in bins_by_column
+        ]
+        lookup = np.full(np.prod(shape, dtype=np.intp), None, dtype=object)
+        labels = np.full(len(lookup), np.nan, dtype=object)
+        for mb in multibins:
+            i = np.ravel_multi_index(
+                tuple(position_by_index[j][b.index] for j, b in enumerate(mb.bins)),
+                shape,
+            )
+            lookup[i] = mb
+            labels[i] = mb.label
+
+        mapped = (positions >= 0).all(axis=0)
+        flat = np.ravel_multi_index(tuple(positions[:, mapped]), shape)
+        df_bins = np.full(len(df), None, dtype=object)
+        df_bins[mapped] = lookup[flat]
+        df_labels = np.full(len(df), np.nan, dtype=object)
+        df_labels[mapped] = labels[flat]
+        df["_bin"] = df_bins
+        df["_bin_label"] = df_labels
         return df
 
     def count_bins_1d(self, column):
@@ -69,7 +106,7 @@ class BinnedData:
         """Count number of elements within each multi-dimensional bin."""
         df = self.df
         if skip_outliers:
-            df = df[~df._outlier_bin & ~df._outlier_value]
+            df = df[~df._outlier_bin]
         df = (
             df._bin.value_counts()
             .reset_index()
@@ -95,6 +132,17 @@ class BinnedData:
         )
 
 
+def _assign_bins(values, edges):
+    """Position of the bin in `edges` containing each value, or -1 if none does.
+
+    Like `Bin.filter_expr`, bins are closed on both ends; a value on a shared
+    edge maps to the upper of the two bins."""
+    positions = np.searchsorted(edges, values, side="right") - 1
+    positions[values == edges[-1]] = len(edges) - 2
+    positions[(values < edges[0]) | (values > edges[-1]) | np.isnan(values)] = -1
+    return positions
+
+
 class Binning(object):
     """ Contains list of multidimensional bins """
 
@@ -118,7 +166,7 @@ class Binning(object):
         )
         return df_x.merge(df_y)
 
-    def bin(self, values, column_name, n_bins, fixed_width):
+    def bin(self, values, column_name, n_bins, fixed_width, update_multibins=True):
         """Generate and store  1-dimensional binning for the specific column"""
         if fixed_width:
             bins, edges = pd.cut(values, n_bins, retbins=True, duplicates="drop")
@@ -129,16 +177,28 @@ class Binning(object):
             raise ValueError(
                 f"Duplicate bins were created for {column_name} -- this usually occurs if a large number of data points have the same value, i.e. zero. Try using fewer bins. Set n_bins to 1 and run model.diagnostics() to view data.  \nStats: \n{values.describe()}"
             )
-        self._add_column(column=column_name, edges=edges)
+        self._add_column(
+            column=column_name, edges=edges, update_multibins=update_multibins
+        )
+
+    def bin_columns(self, columns):
+        """Generate and store 1-dimensional binnings for several columns, given as
+        (values, column_name, n_bins, fixed_width) tuples.  Multi-dimensional bins
+        are only rebuilt once, after all columns are binned."""
+        for values, column_name, n_bins, fixed_width in columns:
+            self.bin(values, column_name, n_bins, fixed_width, update_multibins=False)
+        self._update_multibins()
+        return self
 
-    def _add_column(self, column, edges):
+    def _add_column(self, column, edges, update_multibins=True):
         """Add a new 1-demsnsional bin to internal data structure."""
         this_bins = []
         for i in range(len(edges) - 1):
             this_bins.append(Bin(column, edges[i], edges[i + 1], i))
         self.bins[column] = this_bins
         self.edges_1d[column] = edges
-        self._update_multibins()
+        if update_multibins:
+            self._update_multibins()
         return self
 
     def _update_multibins(self):
@@ -182,14 +242,20 @@ class MultiBin:
         each dimension of this bin."""
         return lambda df: reduce(and_, [(b.filter_expr()(df)) for b in self.bins])
 
+    def _mapped_rows(self, df):
+        """Rows of a BinnedData dataframe that were mapped to this bin.  Unlike
+        filter_expr, a row on an edge shared with a neighbouring bin is only
+        in one of them."""
+        return df[df["_bin_label"] == self.label]
+
     def get_max_n_target(self, df):
-        return len(df[self.filter_expr()(df)])
+        return len(self._mapped_rows(df))
 
     def sample(self, df, n_target, min_n_treatment_per_bin, random_seed=1):
-        """Sample n_target elements from dataframe df that fall 
-        within each dimension of this bin."""
+        """Sample n_target elements from BinnedData dataframe df that were
+        mapped to this bin."""
 
-        d1 = df[self.filter_expr()(df)]
+        d1 = self._mapped_rows(df)
 
         if n_target < min_n_treatment_per_bin:
             raise ModelSamplingException(
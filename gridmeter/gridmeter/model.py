@@ -19,7 +19,9 @@
 """
 
 import copy
+import functools
 import pandas as pd
+from typing import Optional
 import itertools
 import logging
 from plotnine import *
@@ -39,6 +41,89 @@ pd.options.mode.chained_assignment = None  # suppress warnings
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=128)
+def _format_n_bins(n_bins):
+    """Format a tuple of (column, n_bins) pairs.  Cached because the auto-bin search
+    formats the same bin counts repeatedly."""
+    return ",".join([f"{col}:{n} bins" for col, n in n_bins])
+
+
+def _search_n_bins(outcome, start):
+    """Search for a stopping point of `outcome`, starting from n_bins=`start`.
+
+    `outcome(n_bins)` returns the n_bins to settle on if the search should stop at
+    `n_bins`, or None if more bins are needed; a ValueError or
+    ModelSamplingException also counts as stopping.  n_bins is doubled until the
+    search stops, then the range between the last two probes is bisected for the
+    smallest probe that stops.  If that probe raised, its exception is re-raised.
+
+    This takes ~2*log2(k) calls instead of the k a one-bin-at-a-time ramp needs,
+    but it only finds the ramp's result if the stopping condition is monotone in
+    n_bins.  Equivalence tests and bin ratios generally are not, so the result
+    can differ from the ramp's."""
+    outcomes = {}
+
+    def _stops(n_bins):
+        try:
+            outcomes[n_bins] = outcome(n_bins)
+        except (ValueError, ModelSamplingException) as e:
+            outcomes[n_bins] = e
+        return outcomes[n_bins] is not None
+
+    lo, hi = None, start
+    while not _stops(hi):
+        lo, hi = hi, hi * 2
+    if lo is not None:
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if _stops(mid):
+                hi = mid
+            else:
+                lo = mid
+    if isinstance(outcomes[hi], Exception):
+        raise outcomes[hi]
+    return outcomes[hi]
+
+
+class ColumnSpec:
+    """ Stratification settings for a single column """
+
+    __slots__ = (
+        "name",
+        "auto_bin",
+        "n_bins",
+        "min_value_allowed",
+        "max_value_allowed",
+        "fixed_width",
+        "auto_bin_require_equivalence",
+        "dtype",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        auto_bin: bool,
+        n_bins: int,
+        min_value_allowed: Optional[float] = None,
+        max_value_allowed: Optional[float] = None,
+        fixed_width: bool = True,
+        auto_bin_require_equivalence: bool = True,
+        dtype: type = np.float64,
+    ):
+        self.name = name
+        self.auto_bin = auto_bin
+        self.n_bins = n_bins
+        self.min_value_allowed = min_value_allowed
+        self.max_value_allowed = max_value_allowed
+        self.fixed_width = fixed_width
+        self.auto_bin_require_equivalence = auto_bin_require_equivalence
+        self.dtype = dtype
+
+    def __repr__(self):
+        attrs = ", ".join(f"{a}={getattr(self, a)!r}" for a in self.__slots__)
+        return f"ColumnSpec({attrs})"
+
+
 class StratifiedSampling(object):
     """
     Perform stratified sampling on a treatment group and comparison pool.  
@@ -89,24 +174,63 @@ class StratifiedSampling(object):
         self.data_pool = None
         self.data_sample = None
 
-    def _chop_outliers(self, df):
-        for name, c in self.columns.items():
-            if c["min_value_allowed"] is not None:
-                df = df[df[c["name"]] >= c["min_value_allowed"]]
-            if c["max_value_allowed"] is not None:
-                df = df[df[c["name"]] <= c["max_value_allowed"]]
-        return df
-
-    def _perturb(self, df_orig, col_names=None, random_seed=1):
+    def _col_arrays(self):
+        """Column names with their allowed bounds as parallel arrays (NaN where
+        a bound is not set)."""
+        names = list(self.columns.keys())
+        min_allowed = np.array(
+            [
+                np.nan if c.min_value_allowed is None else c.min_value_allowed
+                for c in self.columns.values()
+            ],
+            dtype=float,
+        )
+        max_allowed = np.array(
+            [
+                np.nan if c.max_value_allowed is None else c.max_value_allowed
+                for c in self.columns.values()
+            ],
+            dtype=float,
+        )
+        return names, min_allowed, max_allowed
+
+    def _within_bounds(self, values):
+        """Mask of rows of `values` (one column per model column) that are within
+        every column's allowed bounds."""
+        _, min_allowed, max_allowed = self._col_arrays()
+        return (
+            (np.isnan(min_allowed) | (values >= min_allowed))
+            & (np.isnan(max_allowed) | (values <= max_allowed))
+        ).all(axis=1)
+
+    def _perturbation(self, values, random_seed=1):
+        """Random noise of 1e-6 of each column's range, same shape as `values`."""
+        rng = np.random.default_rng(random_seed)
+        ranges = np.nanmax(values, axis=0) - np.nanmin(values, axis=0)
+        return (rng.random(values.shape) - 0.5) * ranges * 1e-6
+
+    def _prepare(self, df, random_seed=1):
+        """Remove rows outside of the allowed bounds and perturb the model columns,
+        reading the column values out of `df` only once."""
         # qcut doesn't work if the same value recurs too many times, i.e. zero.  We can add a small amount of random noise to fix this
-        np.random.seed(random_seed)
-        df_pert = df_orig.copy()
-        col_names = col_names if col_names else list(self.columns.keys())
-        for col_name in col_names:
-            range = df_pert[col_name].max() - df_pert[col_name].min()
-            perturbation = (np.random.random(len(df_pert)) - 0.5) * range * 1e-6
-            df_pert.loc[:, col_name] = df_pert[col_name] + perturbation
-        return df_pert
+        # (qcut's duplicates="drop" is not a substitute: it silently yields fewer than
+        # n_bins bins, which Binning.bin rejects, and pool rows must be perturbed the
+        # same way to land on the same side of edges placed between tied values)
+        names = list(self.columns.keys())
+        values = df[names].to_numpy(dtype=float)
+        mask = self._within_bounds(values)
+        # boolean indexing returns a new frame, so writing the perturbed columns
+        # below never touches df
+        df_prepared = df.loc[mask]
+        if df_prepared.empty:
+            return df_prepared
+        values = values[mask]
+        values += self._perturbation(values, random_seed=random_seed)
+        # store each column in its configured dtype so the values that are binned
+        # and the values that are mapped to bins are the same
+        for i, name in enumerate(names):
+            df_prepared[name] = values[:, i].astype(self.columns[name].dtype)
+        return df_prepared
 
     def add_column(
         self,
@@ -116,6 +240,7 @@ class StratifiedSampling(object):
         max_value_allowed: int = None,
         fixed_width: int = True,
         auto_bin_require_equivalence: bool = True,
+        dtype: type = np.float64,
     ):
         """
         Add a stratification column to the model.
@@ -133,19 +258,25 @@ class StratifiedSampling(object):
             Maximum treatment value used to construct bins (used to remove outliers).
         auto_bin_require_equivalence: bool
             Whether the column requires equivalence when auto-binning
+        dtype: type
+            Floating point type the column's values are stored in while binning and
+            sampling. np.float32 halves memory use if the values don't need more
+            precision; tied values that the perturbation can't separate at float32
+            precision may still make quantile binning (fixed_width=False) fail.
         """
         auto_bin = n_bins is None
         n_bins = 1 if n_bins is None else n_bins
 
-        self.columns[name] = {
-            "name": name,
-            "auto_bin": auto_bin,
-            "n_bins": n_bins,
-            "min_value_allowed": min_value_allowed,
-            "max_value_allowed": max_value_allowed,
-            "fixed_width": fixed_width,
-            "auto_bin_require_equivalence": auto_bin_require_equivalence,
-        }
+        self.columns[name] = ColumnSpec(
+            name=name,
+            auto_bin=auto_bin,
+            n_bins=n_bins,
+            min_value_allowed=min_value_allowed,
+            max_value_allowed=max_value_allowed,
+            fixed_width=fixed_width,
+            auto_bin_require_equivalence=auto_bin_require_equivalence,
+            dtype=dtype,
+        )
 
         self.binning = None
         self.trained = False
@@ -158,7 +289,7 @@ class StratifiedSampling(object):
             raise ValueError(
                 "No columns found in model. Use add_columns(...) to add a column."
             )
-        missing_cols = list(set(self.col_names) - set(df.columns))
+        missing_cols = [c for c in self.col_names if c not in df.columns]
         if len(missing_cols) > 0:
             raise ValueError(
                 f"data is missing required columns: {','.join(missing_cols)}"
@@ -194,16 +325,33 @@ class StratifiedSampling(object):
             If True, treats n_samples_approx as an upper bound, but gets as many comparison group
             meters as available up to n_samples_approx. If False, it raises an exception
             if there are not enough comparison pool meters to reach n_samples_approx.
-            
+
+        For columns added without n_bins, the number of bins is searched for by
+        doubling n_bins until equivalence passes (or the sampled-to-treatment ratio
+        is violated) and then bisecting.  Equivalence is not monotone in n_bins, so
+        this may settle on a different number of bins than adding one bin at a time
+        would.
         """
         if len(self.columns) == 0:
             raise ValueError("You must add at least one column before fitting.")
         logger.debug(self.columns)
+        # outlier removal and perturbation don't depend on the binning, so prepare
+        # the pool once rather than on every auto-bin step
+        self._check_columns_present(df_pool)
+        df_pool_prepared = self._prepare(df_pool, random_seed=random_seed)
+        # Columns are searched in order and each search fits multi-dimensional bins
+        # using the n_bins already chosen for earlier columns, so the searches are
+        # not independent and can't be run concurrently without changing results.
         for name, col in self.columns.items():
-            if col["auto_bin"]:
-                completed = False
-                while not completed:
-                    logging.info(f"Computing bins: {self.get_all_n_bins_as_str()} ")
+            if col.auto_bin:
+
+                def _auto_bin_outcome(n_bins):
+                    """Fit and sample with `n_bins` for this column. Returns the
+                    n_bins to settle on if the search should stop here, or None
+                    if more bins are needed."""
+                    self.set_n_bins(name, n_bins)
+                    if logger.isEnabledFor(logging.INFO):
+                        logger.info(f"Computing bins: {self.get_all_n_bins_as_str()} ")
                     self.fit(
                         df_treatment,
                         min_n_treatment_per_bin=min_n_treatment_per_bin,
@@ -214,43 +362,46 @@ class StratifiedSampling(object):
                         n_samples_approx=n_samples_approx,
                         random_seed=random_seed,
                         relax_n_samples_approx_constraint=relax_n_samples_approx_constraint,
+                        df_pool_prepared=df_pool_prepared,
                     )
+                    # build diagnostics once per step and reuse for every check
+                    diagnostics = self.diagnostics()
 
                     def _violates_ratio():
                         n_sampled_to_n_treatment_ratio = (
-                            self.diagnostics().n_sampled_to_n_treatment_ratio()
+                            diagnostics.n_sampled_to_n_treatment_ratio()
                         )
                         if (
                             n_sampled_to_n_treatment_ratio
                             < min_n_sampled_to_n_treatment_ratio
                         ):
                             logger.info(
-                                f"Insufficient pool data in one of the bins for {col['name']}:"
+                                f"Insufficient pool data in one of the bins for {col.name}:"
                                 f"found {n_sampled_to_n_treatment_ratio}:1 but need "
                                 f"{min_n_sampled_to_n_treatment_ratio}:1. Using last successful n_bins."
                             )
                             return True
                         return False
 
-                    if col["auto_bin_require_equivalence"]:
+                    if col.auto_bin_require_equivalence:
                         if self.data_sample.df.empty:
                             raise ValueError(
                                 "Too many bin divisions before finding equivalence"
-                                f" for {col['name']} (usually occurs when several"
+                                f" for {col.name} (usually occurs when several"
                                 " stratification params are used)."
                             )
-                        completed = self.diagnostics().equivalence_passed([col["name"]])
-                        if min_n_sampled_to_n_treatment_ratio and _violates_ratio():
-                            completed = True
-                            self.set_n_bins(name, self.get_n_bins(name) - 1)
-                        if not completed:
-                            self.set_n_bins(name, self.get_n_bins(name) + 1)
-                    else:
+                        completed = diagnostics.equivalence_passed([col.name])
                         if min_n_sampled_to_n_treatment_ratio and _violates_ratio():
-                            self.set_n_bins(name, self.get_n_bins(name) - 1)
-                            completed = True
-                        else:
-                            self.set_n_bins(name, self.get_n_bins(name) + 1)
+                            return n_bins - 1
+                        if completed:
+                            return n_bins
+                    elif min_n_sampled_to_n_treatment_ratio and _violates_ratio():
+                        return n_bins - 1
+                    return None
+
+                self.set_n_bins(
+                    name, _search_n_bins(_auto_bin_outcome, self.get_n_bins(name))
+                )
 
         self.fit(
             df_treatment,
@@ -264,58 +415,44 @@ class StratifiedSampling(object):
             n_samples_approx=n_samples_approx,
             random_seed=random_seed,
             relax_n_samples_approx_constraint=relax_n_samples_approx_constraint,
+            df_pool_prepared=df_pool_prepared,
         )
         self.n_samples_approx = n_samples_approx
         return df_sample
 
     def print_n_bins(self):
-        logger.info(self.get_all_n_bins_as_str())
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(self.get_all_n_bins_as_str())
 
     def get_all_n_bins_as_str(self):
-        return ",".join(
-            [f"{col}:{self.get_n_bins(col)} bins" for col in self.columns.keys()]
+        return _format_n_bins(
+            tuple((name, col.n_bins) for name, col in self.columns.items())
         )
 
     def get_n_bins(self, col_name):
-        col = self.columns[col_name]
-        return col["n_bins"]
+        return self.columns[col_name].n_bins
 
     def set_n_bins(self, col_name, n_bins):
-        col = self.columns[col_name]
-        col["n_bins"] = n_bins
-        self.columns[col_name] = col
+        self.columns[col_name].n_bins = n_bins
 
     def fit(self, df_treatment, min_n_treatment_per_bin=0, random_seed=1):
         self._check_columns_present(df_treatment)
-        df_treatment = self._perturb(
-            self._chop_outliers(df_treatment), random_seed=random_seed
-        )
-        self.df_treatment = df_treatment.copy()
+        df_treatment = self._prepare(df_treatment, random_seed=random_seed)
+        self.df_treatment = df_treatment
         self.binning = Binning()
 
-        self.df_treatment["_outlier_value"] = False
-        for name, col in self.columns.items():
-
-            if col["min_value_allowed"] is not None:
-                self.df_treatment.loc[
-                    self.df_treatment[col["name"]] < col["min_value_allowed"],
-                    "_outlier_value",
-                ] = True
-            if col["max_value_allowed"] is not None:
-                self.df_treatment.loc[
-                    self.df_treatment[col["name"]] > col["max_value_allowed"],
-                    "_outlier_value",
-                ] = True
-
-        for name, col in self.columns.items():
-            values = (
-                self.df_treatment.loc[~self.df_treatment._outlier_value, col["name"]]
-                .dropna()
-                .astype(float)
-            )
-            self.binning.bin(
-                values, col["name"], col["n_bins"], fixed_width=col["fixed_width"]
-            )
+        # _prepare has already dropped rows outside of the allowed bounds
+        self.binning.bin_columns(
+            [
+                (
+                    self.df_treatment[col.name].dropna(),
+                    col.name,
+                    col.n_bins,
+                    col.fixed_width,
+                )
+                for name, col in self.columns.items()
+            ]
+        )
 
         self.data_treatment = BinnedData(
             self.df_treatment,
@@ -340,12 +477,16 @@ class StratifiedSampling(object):
         n_samples_approx=None,
         random_seed=1,
         relax_n_samples_approx_constraint=False,
+        df_pool_prepared=None,
     ):
         if not self.trained and data_treatment is not None:
             raise ValueError("No model found; please run fit()")
         self._check_columns_present(df_pool)
-        df_pool = self._perturb(self._chop_outliers(df_pool), random_seed=random_seed)
-        self.data_pool = BinnedData(df_pool, self.binning)
+        if df_pool_prepared is None:
+            df_pool_prepared = self._prepare(df_pool, random_seed=random_seed)
+        # BinnedData adds its bin columns in place, so bin a shallow copy to keep
+        # df_pool_prepared reusable
+        self.data_pool = BinnedData(df_pool_prepared.copy(deep=False), self.binning)
         (
             n_samples_approx,
             relax_ratio_constraint,
@@ -48,6 +48,37 @@ def test_binned_data_bin_label_label_leading_zeroes():
 
 
 
+def test_binned_data_map_bins_shared_edges():
+    col_name = "c1"
+    binning = Binning()
+    binning._add_column(col_name, edges=[0.0, 1.0, 2.0, 3.0])
+    df = pd.DataFrame({col_name: [-1.0, 0.0, 0.5, 1.0, 2.5, 3.0, 4.0, None]})
+
+    binned_data = BinnedData(df, binning)
+    assert list(binned_data.df["_bin_label"].fillna("")) == [
+        "",
+        "c1_000",
+        "c1_000",
+        "c1_001",
+        "c1_002",
+        "c1_002",
+        "",
+        "",
+    ]
+
+
+
+def test_binning_bin_columns():
+    df = pd.DataFrame({"c1": range(100), "c2": range(0, 200, 2)})
+    binning = Binning()
+    binning.bin_columns([(df["c1"], "c1", 2, True), (df["c2"], "c2", 3, False)])
+
+    assert len(binning.bins["c1"]) == 2
+    assert len(binning.bins["c2"]) == 3
+    assert len(binning.multibins) == 6
+
+
+
 '''
 
 def test_multi_bin_filtering():
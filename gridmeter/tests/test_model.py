@@ -22,7 +22,7 @@ import numpy as np
 import pandas as pd
 import pytest
 
-from gridmeter.model import StratifiedSampling, BinnedData
+from gridmeter.model import ColumnSpec, StratifiedSampling, BinnedData, _search_n_bins
 from gridmeter.bins import ModelSamplingException
 
 
@@ -308,3 +308,205 @@ def test_stratified_sampling_fit_and_sample_upper_limit_n_samples_approx(
     output = stratified_sampling_obj.data_sample.df
     bins_df = stratified_sampling_obj.diagnostics().count_bins()
     assert not output.empty
+
+
+def test_stratified_sampling_prepare_chops_outliers(stratified_sampling_obj):
+    df = pd.DataFrame(
+        {
+            "col1": [1, 5, 6, 8, 9, None, 7],
+            "col2": [0, 0, 10, 0, 0, 0, 0],
+            "col3": [0, 0, 0, 0, 0, 0, None],
+        }
+    )
+    stratified_sampling_obj.add_column(
+        "col1", min_value_allowed=5, max_value_allowed=8
+    )
+    stratified_sampling_obj.add_column("col2", max_value_allowed=5)
+    stratified_sampling_obj.add_column("col3")
+    df_chopped = stratified_sampling_obj._prepare(df)
+    # missing values only count as outliers in columns that have bounds
+    assert list(df_chopped.index) == [1, 3, 6]
+
+
+def test_stratified_sampling_prepare_perturbs(stratified_sampling_obj):
+    df = pd.DataFrame(
+        {
+            "id": ["a", "b", "c", "d"],
+            "col1": [0, 0, 0, 10],
+            "col2": [1.0, 1.0, 2.0, 3.0],
+        }
+    )
+    stratified_sampling_obj.add_column("col1", fixed_width=False)
+    stratified_sampling_obj.add_column("col2")
+    df_pert1 = stratified_sampling_obj._prepare(df, random_seed=1)
+    df_pert2 = stratified_sampling_obj._prepare(df, random_seed=1)
+    pd.testing.assert_frame_equal(df_pert1, df_pert2)
+    assert df_pert1["col1"].is_unique
+    assert df_pert1["col2"].is_unique
+    assert list(df_pert1["id"]) == ["a", "b", "c", "d"]
+    assert list(df["col1"]) == [0, 0, 0, 10]
+    assert list(df["col2"]) == [1.0, 1.0, 2.0, 3.0]
+    diff = df_pert1[["col1", "col2"]] - df[["col1", "col2"]]
+    assert diff.abs().max().max() < 1e-5
+
+
+def test_stratified_sampling_fit_does_not_modify_input(
+    stratified_sampling_obj, df_treatment, col_name
+):
+    df_orig = df_treatment.copy()
+    stratified_sampling_obj.add_column(col_name, n_bins=2)
+    stratified_sampling_obj.fit(df_treatment)
+    pd.testing.assert_frame_equal(df_treatment, df_orig)
+
+
+def test_stratified_sampling_prepare_leaves_global_random_state(
+    stratified_sampling_obj,
+):
+    df = pd.DataFrame({"col1": [0.0, 0.0, 1.0]})
+    stratified_sampling_obj.add_column("col1", fixed_width=False)
+    np.random.seed(0)
+    expected = np.random.random()
+    np.random.seed(0)
+    stratified_sampling_obj._prepare(df, random_seed=1)
+    assert np.random.random() == expected
+
+
+def test_stratified_sampling_check_columns_present(stratified_sampling_obj):
+    stratified_sampling_obj.add_column("col1")
+    stratified_sampling_obj.add_column("col2")
+    stratified_sampling_obj.add_column("col3")
+    with pytest.raises(ValueError, match="missing required columns: col1,col3"):
+        stratified_sampling_obj._check_columns_present(pd.DataFrame({"col2": [1]}))
+
+
+@pytest.mark.parametrize("fixed_width", [True, False])
+def test_stratified_sampling_fit_and_sample_float32(fixed_width):
+    rng = np.random.default_rng(0)
+    df_treatment = pd.DataFrame({"id": range(1000), "col1": rng.random(1000)})
+    df_pool = pd.DataFrame({"id": range(5000), "col1": rng.random(5000)})
+    stratified_sampling_obj = StratifiedSampling()
+    stratified_sampling_obj.add_column(
+        "col1", n_bins=4, fixed_width=fixed_width, dtype=np.float32
+    )
+    stratified_sampling_obj.fit_and_sample(
+        df_treatment,
+        df_pool,
+        n_samples_approx=100,
+        random_seed=1,
+        min_n_sampled_to_n_treatment_ratio=None,
+    )
+    df_binned = stratified_sampling_obj.data_treatment.df
+    assert df_binned["col1"].dtype == np.float32
+    assert df_binned["_bin"].notnull().all()
+    bins_df = stratified_sampling_obj.diagnostics().count_bins()
+    assert len(bins_df) == 4
+
+
+def test_stratified_sampling_add_column_spec(stratified_sampling_obj):
+    stratified_sampling_obj.add_column("col1", max_value_allowed=10)
+    col = stratified_sampling_obj.columns["col1"]
+    assert isinstance(col, ColumnSpec)
+    assert col.auto_bin
+    assert col.max_value_allowed == 10
+    assert col.min_value_allowed is None
+    stratified_sampling_obj.set_n_bins("col1", 3)
+    assert stratified_sampling_obj.get_n_bins("col1") == 3
+    with pytest.raises(AttributeError):
+        col.unknown = 1
+
+
+def test_stratified_sampling_get_all_n_bins_as_str(stratified_sampling_obj):
+    stratified_sampling_obj.add_column("col1", n_bins=2)
+    stratified_sampling_obj.add_column("col2")
+    assert stratified_sampling_obj.get_all_n_bins_as_str() == "col1:2 bins,col2:1 bins"
+    stratified_sampling_obj.set_n_bins("col2", 4)
+    assert stratified_sampling_obj.get_all_n_bins_as_str() == "col1:2 bins,col2:4 bins"
+
+
+def _recording_outcome(outcome):
+    calls = []
+
+    def _outcome(n_bins):
+        calls.append(n_bins)
+        return outcome(n_bins)
+
+    return _outcome, calls
+
+
+def test_search_n_bins_stops_at_first_passing_n_bins():
+    outcome, calls = _recording_outcome(lambda n: n if n >= 13 else None)
+    assert _search_n_bins(outcome, 1) == 13
+    assert calls == [1, 2, 4, 8, 16, 12, 14, 13]
+    outcome, calls = _recording_outcome(lambda n: n)
+    assert _search_n_bins(outcome, 3) == 3
+    assert calls == [3]
+
+
+def test_search_n_bins_ratio_violation_uses_previous_n_bins():
+    # the ratio is first violated at 6 bins, so the search settles on 5
+    outcome, calls = _recording_outcome(lambda n: n - 1 if n >= 6 else None)
+    assert _search_n_bins(outcome, 1) == 5
+    assert max(calls) == 8
+
+
+def test_search_n_bins_reraises_exception_at_stopping_point():
+    def outcome(n_bins):
+        if n_bins >= 7:
+            raise ModelSamplingException(f"too many bins: {n_bins}")
+        return None
+
+    with pytest.raises(ModelSamplingException, match="too many bins: 7"):
+        _search_n_bins(outcome, 1)
+
+
+def test_search_n_bins_ignores_exception_past_stopping_point():
+    def outcome(n_bins):
+        if n_bins >= 8:
+            raise ValueError("Duplicate bins")
+        return n_bins if n_bins >= 5 else None
+
+    assert _search_n_bins(outcome, 1) == 5
+
+
+@pytest.mark.parametrize("fixed_width", [True, False])
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+@pytest.mark.parametrize("offset", [0, 100000])
+def test_stratified_sampling_sample_pool_values_on_bin_edges(
+    fixed_width, dtype, offset
+):
+    # edges fall (almost) exactly on pool values 3.0 and 6.0, and float32 can round
+    # the perturbation away; each pool meter must still be sampled at most once
+    df_treatment = pd.DataFrame(
+        {"id": [f"t{x}" for x in range(10)], "col1": np.arange(10.0) + offset}
+    )
+    df_pool = pd.DataFrame(
+        {"id": [f"p{x}" for x in range(300)], "col1": np.arange(300) / 30 + offset}
+    )
+    for random_seed in range(10):
+        stratified_sampling_obj = StratifiedSampling()
+        stratified_sampling_obj.add_column(
+            "col1", n_bins=3, fixed_width=fixed_width, dtype=dtype
+        )
+        stratified_sampling_obj.fit(df_treatment, random_seed=random_seed)
+        df_sample = stratified_sampling_obj.sample(
+            df_pool, random_seed=random_seed
+        ).df
+        assert df_sample["id"].is_unique
+
+
+def test_stratified_sampling_sample_df_pool_prepared(df_treatment, df_pool, col_name):
+    stratified_sampling_obj = StratifiedSampling()
+    stratified_sampling_obj.add_column(col_name, n_bins=3)
+    stratified_sampling_obj.fit(df_treatment)
+    sample = stratified_sampling_obj.sample(df_pool, n_samples_approx=40).df
+
+    df_pool_prepared = stratified_sampling_obj._prepare(df_pool, random_seed=1)
+    prepared_columns = list(df_pool_prepared.columns)
+    sample_prepared = stratified_sampling_obj.sample(
+        df_pool, n_samples_approx=40, df_pool_prepared=df_pool_prepared
+    ).df
+    assert list(sample_prepared["id"]) == list(sample["id"])
+    # the prepared frame is left reusable for the next sample() call
+    assert list(df_pool_prepared.columns) == prepared_columns
+    assert "_bin" not in df_pool_prepared
+    assert "_outlier_bin" not in df_pool_prepared